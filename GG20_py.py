@@ -8,6 +8,8 @@
 # In[1]:
 
 
+import os
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import requests
 from web3 import Web3
@@ -15,6 +17,15 @@ from tabulate import tabulate
 from eth_abi import decode_single, decode_abi
 import plotly.graph_objects as go
 import matplotlib.pyplot as plt
+from dedup import DonationDeduplicator
+from pricing import attach_usd_values, update_price_cache
+from stages import StageRunner
+from tracing import trace_internal_allocations
+from eas import EAS_SCHEMA_IDS, sync_attestation_csvs
+from cube import DonationCube, benchmark_cube_slices, format_pct
+from qf import estimate_round_matching
+from shared_table import aggregate_shared, cleanup_stale_tables, publish_table, unpublish_table
+from sketches import build_partition_sketches, key_column, merge_partition_sketches, save_sketches, sketch_error_report
 
 
 # #### Constants and Functions
@@ -23,6 +34,12 @@ import matplotlib.pyplot as plt
 
 
 ACROSS_REQUEST_URL = "https://api.across.to/deposits/details"
+# Append new attestations from the EAS indexer to attestations_{chain}.csv before reading them
+FETCH_ATTESTATIONS = False
+# Set to False to force every memoized stage to re-run
+STAGE_CACHE_ENABLED = True
+# Compare sketch estimates against exact nunique()/median() on the full frames
+SKETCH_ERROR_CHECK = True
 
 
 def to_eth(value):
@@ -73,6 +90,14 @@ def fetch_deposit_details(tx_hash, origin_chain_id):
     return result
 
 
+# Network-bound stages are memoized in `stage_cache/` under a hash of their input data, config and code, so re-running the notebook skips them when nothing upstream changed. Outputs with rows that failed to fetch are not cached, so those rows are retried on the next run.
+
+# In[40]:
+
+
+stage_runner = StageRunner('stage_cache', enabled=STAGE_CACHE_ENABLED)
+
+
 # #### Importing .csv files
 # The attestation files are downloaded .csv files from EAS' indexer as described here: https://github.com/idriss-crypto/browser-extensions/blob/master/CONTRACTS.md
 # 
@@ -94,7 +119,10 @@ zksync_wrapper = 'zksync_wrapper.csv'
 # In[6]:
 
 
-relevant_columns_attestattion = ['attester', 'data', 'recipient', 'txid', 'id']
+if FETCH_ATTESTATIONS:
+    sync_attestation_csvs({'42161': arbitrum_attestations, '10': optimism_attestations}, schema_ids=EAS_SCHEMA_IDS)
+
+relevant_columns_attestattion = ['attester', 'data', 'recipient', 'txid', 'id', 'time']
 df_attestations_arb = pd.read_csv(arbitrum_attestations, index_col=False)[relevant_columns_attestattion]
 df_attestations_op = pd.read_csv(optimism_attestations, index_col=False)[relevant_columns_attestattion]
 
@@ -107,6 +135,14 @@ df_wrapper_linea = pd.read_csv(linea_wrapper, index_col=False)[relevant_columns_
 df_wrapper_zksync = pd.read_csv(zksync_wrapper, index_col=False)[relevant_columns_wrapper]
 
 
+# The explorer exports carry the historical ETH price at each transaction. They are merged into a local price cache (`price_cache/ETH.csv`), which is used to value donations in USD at donation time.
+
+# In[39]:
+
+
+update_price_cache([arbitrum_wrapper, optimism_wrapper, base_wrapper, linea_wrapper, 'arbitrum_allo.csv', 'optimism_allo.csv'])
+
+
 # In[7]:
 
 
@@ -151,24 +187,35 @@ df_attestations = df_attestations.rename(columns={'recipient':'attestation_recip
 # In[10]:
 
 
-df_wrapper['status'] = None
-df_wrapper['message'] = None
-df_wrapper['fillTxhash'] = None
-df_wrapper['destination_chain'] = None
+def resolve_across_deposits(df_wrapper):
+    df_wrapper = df_wrapper.copy()
+    df_wrapper['status'] = None
+    df_wrapper['message'] = None
+    df_wrapper['fillTxhash'] = None
+    df_wrapper['destination_chain'] = None
 
-# Iterate through each row and update the new columns based on API data
-for index, row in df_wrapper.iterrows():
-    deposit_tx_hash = row['Txhash']
-    origin_chain_id = row['origin_chain']
-    
-    # Fetch details and extract relevant fields
-    details = fetch_deposit_details(deposit_tx_hash, origin_chain_id)
-    
-    # Assign the extracted values to the appropriate columns
-    df_wrapper.at[index, 'status'] = details['status']
-    df_wrapper.at[index, 'message'] = details['message']
-    df_wrapper.at[index, 'fillTxhash'] = details['fillTxhash']
-    df_wrapper.at[index, 'destination_chain'] = str(details['destination_chain'])
+    # Iterate through each row and update the new columns based on API data
+    for index, row in df_wrapper.iterrows():
+        deposit_tx_hash = row['Txhash']
+        origin_chain_id = row['origin_chain']
+        
+        # Fetch details and extract relevant fields
+        details = fetch_deposit_details(deposit_tx_hash, origin_chain_id)
+        
+        # Assign the extracted values to the appropriate columns
+        df_wrapper.at[index, 'status'] = details['status']
+        df_wrapper.at[index, 'message'] = details['message']
+        df_wrapper.at[index, 'fillTxhash'] = details['fillTxhash']
+        df_wrapper.at[index, 'destination_chain'] = str(details['destination_chain'])
+    return df_wrapper
+
+df_wrapper = stage_runner.run(
+    'across_resolve', resolve_across_deposits,
+    inputs={'df_wrapper': df_wrapper},
+    depends=[fetch_deposit_details],
+    # fetch_deposit_details leaves every field empty when the Across API request fails
+    failed=lambda df: df['status'].isna().sum()
+)
 
 
 # In[11]:
@@ -194,6 +241,8 @@ if not index_to_update.empty:
     df_wrapper.at[index_to_update[0], 'destination_chain'] = str(correction['destination_chain'])
 
 
+# Each source is checked against a persistent index of (destination chain, tx hash, log index) keys as soon as it is final, so overlapping explorer exports or re-ingested attestations are reported instead of double counted. The attestation exports carry no log index for the fill, so they are matched on (destination chain, tx hash) against allocations that have one.
+
 # In[12]:
 
 
@@ -212,8 +261,19 @@ df_attestations['gg20_round'] = df_attestations.apply(is_gg20_round, axis=1)
 df_attestations = df_attestations[df_attestations['gg20_round']]
 df_attestations.drop(columns='gg20_round', inplace=True)
 attestations_final_df = pd.merge(df_attestations, df_wrapper, left_on='Txhash', right_on='fillTxhash', how='left', indicator=True)
-attestations_final_df.drop(columns=['_merge', 'Method', 'token_sent', 'status', 'destination_chain_y'], inplace=True)
-attestations_final_df = attestations_final_df.rename(columns={'destination_chain_x':'destination_chain', 'Txhash_x':'Txhash_destination', 'Txhash_y':'Txhash_origin'})
+attestations_final_df.drop(columns=['_merge', 'Method', 'status', 'destination_chain_y'], inplace=True)
+attestations_final_df = attestations_final_df.rename(columns={'destination_chain_x':'destination_chain', 'Txhash_x':'Txhash_destination', 'Txhash_y':'Txhash_origin', 'token_sent':'token'})
+
+deduplicator = DonationDeduplicator('dedup_index')
+attestations_final_df, duplicates_attestations = deduplicator.check(attestations_final_df, 'GG20', 'attestation', 'Txhash_destination')
+deduplicator.close()
+print(f"\nDuplicate cross-chain donations removed: {len(duplicates_attestations)}")
+if not duplicates_attestations.empty:
+    print(tabulate(duplicates_attestations[['dedup_key', 'donor', 'amount', 'seen_batch', 'seen_source']], headers='keys', tablefmt='pretty', showindex=False))
+
+attestations_final_df = attach_usd_values(attestations_final_df, 'time')
+sketches_cross_chain = build_partition_sketches(attestations_final_df)
+cube_cross_chain = DonationCube.from_frame(attestations_final_df, 'time')
 
 
 # In[13]:
@@ -230,6 +290,9 @@ num_unique_recipients = attestations_final_df['recipient_id'].nunique()
 avg_amount = attestations_final_df['amount'].mean()
 median_amount = attestations_final_df['amount'].median()
 total_amount = attestations_final_df['amount'].sum()
+avg_amount_usd = attestations_final_df['amount_usd'].mean()
+median_amount_usd = attestations_final_df['amount_usd'].median()
+total_amount_usd = attestations_final_df['amount_usd'].sum()
 top_donor = attestations_final_df['donor'].value_counts().idxmax()
 top_recipient = attestations_final_df['recipient_id'].value_counts().idxmax()
 top_donor_donations = attestations_final_df[attestations_final_df['donor'] == top_donor].shape[0]
@@ -249,6 +312,9 @@ statistics = {
     'Average Amount': to_eth(avg_amount),
     'Median Amount': to_eth(median_amount),
     'Total Amount': to_eth(total_amount),
+    'Average Amount (USD)': round(avg_amount_usd, 2),
+    'Median Amount (USD)': round(median_amount_usd, 2),
+    'Total Amount (USD)': round(total_amount_usd, 2),
     'Top Donor': top_donor,
     'Top Recipient': top_recipient,
     'Number of Donations by Top Donor': top_donor_donations,
@@ -269,34 +335,37 @@ print(statistics_df)
 # In[15]:
 
 
-transactions_by_origin = attestations_final_df.groupby('origin_chain').agg(
-    transaction_count=('amount', 'count'),
-    total_amount=('amount', 'sum'),
-    average_amount=('amount', 'mean'),
-    median_amount=('amount', 'median')
-)
+origin_slice = cube_cross_chain.slice(['origin_chain'])
+transactions_by_origin = pd.DataFrame({
+    'origin_chain': origin_slice['origin_chain'],
+    'transaction_count': origin_slice['count'],
+    'total_amount': origin_slice['wei_sum'],
+    'average_amount': origin_slice['wei_sum'] / origin_slice['count'],
+    # Medians are not additive, so they are the one column still taken from the donation rows
+    'median_amount': origin_slice['origin_chain'].map(attestations_final_df.groupby(key_column(attestations_final_df, 'origin_chain'))['amount'].median()),
+    'total_usd': origin_slice['usd_sum'].round(2),
+})
 
-transactions_by_origin.reset_index(inplace=True)
-
-transactions_by_origin[['total_amount', 'average_amount', 'median_amount']] =     transactions_by_origin[['total_amount', 'average_amount', 'median_amount']].applymap(to_eth).round(6)
+transactions_by_origin[['total_amount', 'average_amount', 'median_amount']] =     transactions_by_origin[['total_amount', 'average_amount', 'median_amount']].astype(float).applymap(to_eth).round(6)
 
 print("\nTransactions by Origin Chain:")
-print(tabulate(transactions_by_origin, headers='keys', tablefmt='pretty', showindex=False, colalign=('right', 'center', 'right', 'right', 'right')))
+print(tabulate(transactions_by_origin, headers='keys', tablefmt='pretty', showindex=False, colalign=('right', 'center', 'right', 'right', 'right', 'right')))
 
 
 # In[16]:
 
 
-round_id_counts = attestations_final_df['round_id'].value_counts().reset_index()
-round_id_counts.columns = ['round_id', 'count']  # Rename columns for clarity
-
+round_id_counts = cube_cross_chain.slice(['round_id'])
+round_id_counts = pd.DataFrame({
+    'round_id': round_id_counts['round_id'].astype(int),
+    'count': round_id_counts['count'],
+    'percentage': format_pct(round_id_counts['count_pct']),
+    'total_usd': round_id_counts['usd_sum'].round(2),
+})
 round_id_counts.sort_values(by='round_id', inplace=True)
-total_donations = round_id_counts['count'].sum()
-round_id_counts['percentage'] = round_id_counts['count'] / total_donations * 100
-round_id_counts['percentage'] = round_id_counts['percentage'].apply(lambda x: f"{x:.2f}%")
 
 print("\nRound ID Counts Table for Cross-Chain Donations:")
-print(tabulate(round_id_counts, headers='keys', tablefmt='pretty', showindex=False, colalign=('right', 'right', 'right')))
+print(tabulate(round_id_counts, headers='keys', tablefmt='pretty', showindex=False, colalign=('right', 'right', 'right', 'right')))
 
 
 # In[17]:
@@ -379,7 +448,7 @@ w3_op = Web3(provider_op)
 arbitrum_allo = 'arbitrum_allo.csv'
 optimism_allo = 'optimism_allo.csv'
 
-relevant_columns_attestattion = ['Txhash', 'From', 'Method', 'Value_IN(ETH)', 'Status']
+relevant_columns_attestattion = ['Txhash', 'UnixTimestamp', 'From', 'Method', 'Value_IN(ETH)', 'Status']
 df_allo_arb = pd.read_csv(arbitrum_allo, index_col=False)[relevant_columns_attestattion]
 df_allo_op = pd.read_csv(optimism_allo, index_col=False)[relevant_columns_attestattion]
 df_allo_arb['origin_chain'] = 42161
@@ -457,6 +526,7 @@ def decode_tx_data_and_event(row):
             'donor': sender,
             'origin': origin,
             'is_gg20_round': is_gg20_round,
+            'log_index': allocated_event_log['logIndex'],
         }
     else:
         return {
@@ -467,15 +537,29 @@ def decode_tx_data_and_event(row):
             'donor': None,
             'origin': None,
             'is_gg20_round': False,
+            'log_index': None,
         }
 
 
 # In[21]:
 
 
-new_columns = df_allo.apply(lambda row: pd.Series(decode_tx_data_and_event(row)), axis=1)
-
-df_allo = pd.concat([df_allo, new_columns], axis=1)
+def decode_allocations(df_allo, gg20_rounds):
+    new_columns = df_allo.apply(lambda row: pd.Series(decode_tx_data_and_event(row)), axis=1)
+    df_allo = pd.concat([df_allo, new_columns], axis=1)
+    df_allo['is_gg20_round'] = [
+        round_id in gg20_rounds.get(str(chain), []) for round_id, chain in zip(df_allo['round_id'], df_allo['origin_chain'])
+    ]
+    return df_allo
+
+df_allo = stage_runner.run(
+    'decode_same_chain', decode_allocations,
+    inputs={'df_allo': df_allo},
+    config={'gg20_rounds': gg20_rounds},
+    depends=[decode_tx_data_and_event],
+    # decode_tx_data_and_event returns None when the receipt cannot be fetched
+    failed=lambda df: (df['round_id'].isna() & df['recipient_id'].isna()).sum()
+)
 
 
 # In[22]:
@@ -484,6 +568,17 @@ df_allo = pd.concat([df_allo, new_columns], axis=1)
 df_allo = df_allo[df_allo['is_gg20_round']]
 df_allo.drop(columns='is_gg20_round', inplace=True)
 
+deduplicator = DonationDeduplicator('dedup_index')
+df_allo, duplicates_allo = deduplicator.check(df_allo, 'GG20', 'allocate', 'Txhash', 'log_index')
+deduplicator.close()
+print(f"\nDuplicate same chain donations removed: {len(duplicates_allo)}")
+if not duplicates_allo.empty:
+    print(tabulate(duplicates_allo[['dedup_key', 'donor', 'amount', 'seen_batch', 'seen_source']], headers='keys', tablefmt='pretty', showindex=False))
+
+df_allo = attach_usd_values(df_allo, 'UnixTimestamp')
+sketches_same_chain = build_partition_sketches(df_allo)
+cube_same_chain = DonationCube.from_frame(df_allo, 'UnixTimestamp')
+
 
 # In[23]:
 
@@ -496,6 +591,40 @@ print("\nTransactions with None or missing values:")
 print(missing_values_df)
 
 
+# Allocations made through the multi-checkout contract are recovered by tracing the checkout transactions (`{chain}_checkout.csv`, downloaded from the block explorer like the files above). This needs an RPC endpoint with `debug_traceTransaction` enabled; traces are cached per tx hash in `trace_cache/`, so recorded traces can be replayed without a node. These allocations were not made through our extension and are kept out of `df_allo`.
+
+# In[41]:
+
+
+trace_rpc_urls = {
+    '42161': os.environ.get('ARBITRUM_TRACE_RPC'),
+    '10': os.environ.get('OPTIMISM_TRACE_RPC'),
+}
+checkout_files = {'42161': 'arbitrum_checkout.csv', '10': 'optimism_checkout.csv'}
+
+df_checkout = pd.concat([
+    pd.read_csv(path, index_col=False)[['Txhash', 'UnixTimestamp', 'Status']].assign(origin_chain=int(chain))
+    for chain, path in checkout_files.items() if os.path.exists(path)
+] or [pd.DataFrame(columns=['Txhash', 'UnixTimestamp', 'Status', 'origin_chain'])], ignore_index=True)
+df_checkout = df_checkout.loc[df_checkout['Status'] != 'Error(0)']
+
+df_allo_internal = trace_internal_allocations(df_checkout, trace_rpc_urls, gg20_rounds)
+if not df_allo_internal.empty:
+    df_allo_internal = df_allo_internal[df_allo_internal['is_gg20_round']].drop(columns='is_gg20_round')
+    checkout_timestamps = df_checkout.assign(Txhash=df_checkout['Txhash'].str.lower()).drop_duplicates(['Txhash', 'origin_chain'])
+    df_allo_internal = df_allo_internal.merge(checkout_timestamps[['Txhash', 'origin_chain', 'UnixTimestamp']], on=['Txhash', 'origin_chain'], how='left')
+
+    deduplicator = DonationDeduplicator('dedup_index')
+    df_allo_internal, duplicates_internal = deduplicator.check(df_allo_internal, 'GG20', 'checkout', 'Txhash', 'log_index')
+    deduplicator.close()
+    print(f"\nDuplicate multi-checkout allocations removed: {len(duplicates_internal)}")
+    if not duplicates_internal.empty:
+        print(tabulate(duplicates_internal[['dedup_key', 'donor', 'amount', 'seen_batch', 'seen_source']], headers='keys', tablefmt='pretty', showindex=False))
+
+    df_allo_internal = attach_usd_values(df_allo_internal, 'UnixTimestamp')
+print(f"\nMulti-checkout allocations in GG20 rounds: {len(df_allo_internal)}")
+
+
 # In[24]:
 
 
@@ -504,6 +633,9 @@ num_unique_recipients_same_chain = df_allo['recipient_id'].nunique()
 avg_amount_same_chain = df_allo['amount'].mean()
 median_amount_same_chain = df_allo['amount'].median()
 total_amount_same_chain = df_allo['amount'].sum()
+avg_amount_usd_same_chain = df_allo['amount_usd'].mean()
+median_amount_usd_same_chain = df_allo['amount_usd'].median()
+total_amount_usd_same_chain = df_allo['amount_usd'].sum()
 top_donor_same_chain = df_allo['donor'].value_counts().idxmax()
 top_recipient_same_chain = df_allo['recipient_id'].value_counts().idxmax()
 top_donor_donations_same_chain = df_allo[df_allo['donor'] == top_donor].shape[0]
@@ -523,6 +655,9 @@ statistics_same_chain = {
     'Average Amount': to_eth(avg_amount_same_chain),
     'Median Amount': to_eth(median_amount_same_chain),
     'Total Amount': to_eth(total_amount_same_chain),
+    'Average Amount (USD)': round(avg_amount_usd_same_chain, 2),
+    'Median Amount (USD)': round(median_amount_usd_same_chain, 2),
+    'Total Amount (USD)': round(total_amount_usd_same_chain, 2),
     'Top Donor': top_donor_same_chain,
     'Top Recipient': top_recipient_same_chain,
     'Number of Donations by Top Donor': top_donor_donations_same_chain,
@@ -543,16 +678,17 @@ print(statistics_df_same_chain)
 # In[25]:
 
 
-round_id_counts_same_chain = df_allo['round_id'].value_counts().reset_index()
-round_id_counts_same_chain.columns = ['round_id', 'count']  # Rename columns for clarity
-
+round_id_counts_same_chain = cube_same_chain.slice(['round_id'])
+round_id_counts_same_chain = pd.DataFrame({
+    'round_id': round_id_counts_same_chain['round_id'].astype(int),
+    'count': round_id_counts_same_chain['count'],
+    'percentage': format_pct(round_id_counts_same_chain['count_pct']),
+    'total_usd': round_id_counts_same_chain['usd_sum'].round(2),
+})
 round_id_counts_same_chain.sort_values(by='round_id', inplace=True)
-total_donations = round_id_counts_same_chain['count'].sum()
-round_id_counts_same_chain['percentage'] = round_id_counts_same_chain['count'] / total_donations * 100
-round_id_counts_same_chain['percentage'] = round_id_counts_same_chain['percentage'].apply(lambda x: f"{x:.2f}%")
 
 print("\nRound ID Counts Table:")
-print(tabulate(round_id_counts_same_chain, headers='keys', tablefmt='pretty', showindex=False, colalign=('right', 'right', 'right')))
+print(tabulate(round_id_counts_same_chain, headers='keys', tablefmt='pretty', showindex=False, colalign=('right', 'right', 'right', 'right')))
 
 
 # In[26]:
@@ -615,44 +751,45 @@ plt.grid(axis='y')
 
 
 df_combined = pd.concat([df_allo, attestations_final_df], axis=0, ignore_index=True)
+cube_combined = cube_same_chain.update(cube_cross_chain)
 print(df_combined.head())
 
 
+# Combined and per-round figures come from merging the (chain, round, recipient) sketches and the cube, without rescanning rows; only the donor-level figures (top donor, average per donor) still read `df_combined`. Distinct donors and medians are approximate; with `SKETCH_ERROR_CHECK` the exact values are computed from `df_combined` and compared.
+
 # In[28]:
 
 
-num_unique_donors_combined = df_combined['donor'].nunique()
-num_unique_recipients_combined = df_combined['recipient_id'].nunique()
-avg_amount_combined = df_combined['amount'].mean()
-median_amount_combined = df_combined['amount'].median()
-total_amount_combined = df_combined['amount'].sum()
+sketches_combined = merge_partition_sketches(sketches_same_chain, sketches_cross_chain)[()]
+sketches_by_round = merge_partition_sketches(sketches_same_chain, sketches_cross_chain, group_by=('destination_chain', 'round_id'))
+recipient_slice_combined = cube_combined.slice(['recipient_id'])
+
+total_donations_combined = sketches_combined['count']
+total_amount_combined = recipient_slice_combined['wei_sum'].sum()
+total_amount_usd_combined = recipient_slice_combined['usd_sum'].sum()
+top_recipient_combined = recipient_slice_combined.loc[recipient_slice_combined['count'].idxmax()]
+# Donors are not a sketch or cube dimension, so the top donor and per-donor averages still scan df_combined
 top_donor_combined = df_combined['donor'].value_counts().idxmax()
-top_recipient_combined = df_combined['recipient_id'].value_counts().idxmax()
-top_donor_donations_combined = df_combined[df_combined['donor'] == top_donor_combined].shape[0]
-top_recipient_donations_combined = df_combined[df_combined['recipient_id'] == top_recipient_combined].shape[0]
 avg_donations_by_donor_combined = df_combined.groupby('donor')['amount'].mean()
-median_donations_by_donor_combined = df_combined.groupby('donor')['amount'].median()
-avg_donations_by_recipient_combined = df_combined.groupby('recipient_id')['amount'].mean()
-median_donations_by_recipient_combined = df_combined.groupby('recipient_id')['amount'].median()
-round_id_counts_combined = df_combined['round_id'].value_counts()
-total_donations_combined = df_combined.shape[0]
+avg_donations_by_recipient_combined = recipient_slice_combined['wei_sum'] / recipient_slice_combined['count']
 
 
 statistics_combined = {
     'Total Donations': total_donations_combined,
-    'Number of Unique Donors': num_unique_donors_combined,
-    'Number of Unique Recipients': num_unique_recipients_combined,
-    'Average Amount': to_eth(avg_amount_combined),
-    'Median Amount': to_eth(median_amount_combined),
+    'Number of Unique Donors (approx.)': sketches_combined['donors'].count(),
+    'Number of Unique Recipients': len(recipient_slice_combined),
+    'Average Amount': to_eth(total_amount_combined / total_donations_combined),
+    'Median Amount (approx.)': to_eth(sketches_combined['amount'].median()),
     'Total Amount': to_eth(total_amount_combined),
+    'Average Amount (USD)': round(total_amount_usd_combined / total_donations_combined, 2),
+    'Median Amount (USD, approx.)': round(sketches_combined['amount_usd'].median(), 2),
+    'Total Amount (USD)': round(total_amount_usd_combined, 2),
     'Top Donor': top_donor_combined,
-    'Top Recipient': top_recipient_combined,
-    'Number of Donations by Top Donor': top_donor_donations_combined,
-    'Number of Donations Received by Top Recipient': top_recipient_donations_combined,
+    'Top Recipient': top_recipient_combined['recipient_id'],
+    'Number of Donations by Top Donor': df_combined[df_combined['donor'] == top_donor_combined].shape[0],
+    'Number of Donations Received by Top Recipient': top_recipient_combined['count'],
     'Average Donations by Donor': to_eth(avg_donations_by_donor_combined.mean()),
-    'Median Donations by Donor': to_eth(median_donations_by_donor_combined.median()),
     'Average Donations by Recipient': to_eth(avg_donations_by_recipient_combined.mean()),
-    'Median Donations by Recipient': to_eth(median_donations_by_recipient_combined.median())
 }
 
 
@@ -662,47 +799,97 @@ print("\nCombined Statistics:")
 print(statistics_df_combined)
 
 
+# In[37]:
+
+
+sketch_round_table = pd.DataFrame([
+    {
+        'destination_chain': chain,
+        'round_id': round_id,
+        'count': sketch['count'],
+        'unique_donors': sketch['donors'].count(),
+        'median_amount': round(to_eth(sketch['amount'].median()), 6),
+        'median_usd': round(sketch['amount_usd'].median(), 2),
+    }
+    for (chain, round_id), sketch in sorted(sketches_by_round.items())
+])
+print("\nPer-Round Statistics from Sketches:")
+print(tabulate(sketch_round_table, headers='keys', tablefmt='pretty', showindex=False))
+
+if SKETCH_ERROR_CHECK:
+    statistics_exact_combined = {
+        'Number of Unique Donors': df_combined['donor'].nunique(),
+        'Number of Unique Recipients': df_combined['recipient_id'].nunique(),
+        'Median Amount': to_eth(df_combined['amount'].median()),
+        'Median Amount (USD)': round(df_combined['amount_usd'].median(), 2),
+        'Median Donations by Donor': to_eth(df_combined.groupby('donor')['amount'].median().median()),
+        'Median Donations by Recipient': to_eth(df_combined.groupby('recipient_id')['amount'].median().median()),
+    }
+    print("\nCombined Statistics (exact):")
+    print(pd.DataFrame.from_dict(statistics_exact_combined, orient='index', columns=['Value']))
+
+    print("\nSketch Error Check (exact vs. approximate):")
+    print(sketch_error_report(df_combined, sketches_same_chain, sketches_cross_chain))
+    print(sketch_error_report(df_combined, sketches_same_chain, sketches_cross_chain, group_by=('destination_chain', 'round_id')))
+
+
 # In[36]:
 
 
-transactions_by_origin_combined = df_combined.groupby('origin_chain').agg(
-    transaction_count=('amount', 'count'),
-    total_amount=('amount', 'sum'),
-    average_amount=('amount', 'mean'),
-    median_amount=('amount', 'median')
-)
+origin_slice_combined = cube_combined.slice(['origin_chain'])
+transactions_by_origin_combined = pd.DataFrame({
+    'origin_chain': origin_slice_combined['origin_chain'],
+    'transaction_count': origin_slice_combined['count'],
+    'total_amount': origin_slice_combined['wei_sum'],
+    'average_amount': origin_slice_combined['wei_sum'] / origin_slice_combined['count'],
+    # Medians are not additive, so they are the one column still taken from the donation rows
+    'median_amount': origin_slice_combined['origin_chain'].map(df_combined.groupby(key_column(df_combined, 'origin_chain'))['amount'].median()),
+    'total_usd': origin_slice_combined['usd_sum'].round(2),
+})
 
 # Convert amounts to Ethereum
-transactions_by_origin_combined[['total_amount', 'average_amount', 'median_amount']] =     transactions_by_origin_combined[['total_amount', 'average_amount', 'median_amount']].applymap(to_eth).round(6)
-
-# Calculate totals for percentage calculations
-total_transactions = transactions_by_origin_combined['transaction_count'].sum()
-total_amount_sent = transactions_by_origin_combined['total_amount'].sum()
+transactions_by_origin_combined[['total_amount', 'average_amount', 'median_amount']] =     transactions_by_origin_combined[['total_amount', 'average_amount', 'median_amount']].astype(float).applymap(to_eth).round(6)
 
 # Add percentage columns
-transactions_by_origin_combined['transactions_pct'] = (transactions_by_origin_combined['transaction_count'] / total_transactions * 100).round(2).astype(str) + '%'
-transactions_by_origin_combined['amount_pct'] = (transactions_by_origin_combined['total_amount'] / total_amount_sent * 100).round(2).astype(str) + '%'
-
-# Reset index to make 'origin_chain' a column for display
-transactions_by_origin_combined.reset_index(inplace=True)
+transactions_by_origin_combined['transactions_pct'] = format_pct(origin_slice_combined['count_pct'])
+transactions_by_origin_combined['amount_pct'] = format_pct(origin_slice_combined['wei_pct'])
 
 # Print the table
 print("\nCombined Transactions by Origin Chain:")
-print(tabulate(transactions_by_origin_combined, headers='keys', tablefmt='pretty', showindex=False, colalign=('right', 'right', 'right', 'right', 'right', 'right', 'right')))
+print(tabulate(transactions_by_origin_combined, headers='keys', tablefmt='pretty', showindex=False, colalign=('right', 'right', 'right', 'right', 'right', 'right', 'right', 'right')))
+
+
+# #### Matching Estimate
+# Quadratic funding matching per GG20 round, estimated with and without our donations. The baseline is every other contribution we have for the round, i.e. the multi-checkout allocations traced above; without those traces the estimate only covers our own donations. Matching pools (USD) and the per-project caps are round parameters and have to be filled in to normalise the estimate; otherwise the unnormalised (Σ√c)² − Σc matching is reported. Contributions without a USD value cannot enter the QF sums and are counted in `excluded_contributions`.
+
+# In[42]:
+
+
+gg20_matching_pools = {}  # (destination_chain, round_id) -> matching pool in USD, e.g. ('42161', '23'): 100000
+gg20_matching_caps = {}  # (destination_chain, round_id) -> share of the pool a single project can receive, e.g. ('42161', '23'): 0.1
+
+round_matching = estimate_round_matching(df_allo_internal, df_combined, gg20_matching_pools, gg20_matching_caps)
+round_matching[['our_amount', 'matching', 'matching_without_ours', 'matching_earned']] = \
+    round_matching[['our_amount', 'matching', 'matching_without_ours', 'matching_earned']].round(2)
+
+print("\nEstimated Matching per Round (USD):")
+print(tabulate(round_matching, headers='keys', tablefmt='pretty', showindex=False))
 
 
 # In[30]:
 
 
-round_id_counts_combined = df_combined['round_id'].value_counts().reset_index()
-round_id_counts_combined.columns = ['round_id', 'count']  # Rename columns for clarity
-total_donations = round_id_counts_combined['count'].sum()
-round_id_counts_combined['percentage'] = round_id_counts_combined['count'] / total_donations * 100
-round_id_counts_combined['percentage'] = round_id_counts_combined['percentage'].apply(lambda x: f"{x:.2f}%")
+round_id_counts_combined = cube_combined.slice(['round_id'])
+round_id_counts_combined = pd.DataFrame({
+    'round_id': round_id_counts_combined['round_id'].astype(int),
+    'count': round_id_counts_combined['count'],
+    'percentage': format_pct(round_id_counts_combined['count_pct']),
+    'total_usd': round_id_counts_combined['usd_sum'].round(2),
+})
 round_id_counts_combined.sort_values(by='round_id', inplace=True)
 
 print("\nCombined Round ID Counts Table:")
-print(tabulate(round_id_counts_combined, headers='keys', tablefmt='pretty', showindex=False, colalign=('right', 'right', 'right')))
+print(tabulate(round_id_counts_combined, headers='keys', tablefmt='pretty', showindex=False, colalign=('right', 'right', 'right', 'right')))
 
 
 # In[31]:
@@ -847,10 +1034,50 @@ fig.update_layout(
 fig.show()
 
 
+# The finalized donation table is published once as memory-mapped columns in shared memory. Worker processes attach to it by name instead of receiving a pickled copy of `df_combined`, so adding workers does not multiply memory use. Tables left behind by crashed runs are removed first.
+
+# In[43]:
+
+
+cleanup_stale_tables()
+publish_table(df_combined, 'df_combined')
+
+shared_aggregations = [
+    ('origin_chain', 'amount'),
+    ('destination_chain', 'amount'),
+    ('round_id', 'amount_usd'),
+    ('recipient_id', 'amount_usd'),
+    ('donor', 'amount_usd'),
+]
+try:
+    with ProcessPoolExecutor(max_workers=8) as pool:
+        shared_results = list(pool.map(aggregate_shared, ['df_combined'] * len(shared_aggregations), *zip(*shared_aggregations)))
+finally:
+    unpublish_table('df_combined')
+
+for (by, value), result in zip(shared_aggregations, shared_results):
+    print(f"\nTop {by} by {value} (shared table workers):")
+    print(tabulate(result.sort_values(f"{value}_sum", ascending=False).head(5).astype({by: str}), headers='keys', tablefmt='pretty', showindex=False))
+
+
 # In[33]:
 
 
 df_allo.to_csv('df_allo.csv', index=False)
 attestations_final_df.to_csv('attestations_final_df.csv', index=False)
 df_combined.to_csv('df_combined.csv', index=False)
-
+save_sketches(sketches_same_chain, 'sketches_same_chain.json')
+save_sketches(sketches_cross_chain, 'sketches_cross_chain.json')
+cube_combined.save('donation_cube.npz')
+
+print("\nCube Slice Latency:")
+print(tabulate(benchmark_cube_slices(cube_combined, [
+    (['origin_chain'], None),
+    (['round_id'], None),
+    (['destination_chain', 'round_id'], None),
+    (['recipient_id'], {'destination_chain': '42161'}),
+    (['hour'], {'round_id': 9}),
+]), headers='keys', tablefmt='pretty', showindex=False))
+
+print("\nStage Run Log:")
+print(tabulate(stage_runner.log_frame(), headers='keys', tablefmt='pretty', showindex=False))
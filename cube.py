@@ -0,0 +1,118 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from sketches import compact_registers, hll_count, hll_register_updates, key_column
+
+
+CUBE_DIMENSIONS = ['origin_chain', 'destination_chain', 'round_id', 'hour', 'recipient_id']
+CUBE_HLL_PRECISION = 8
+
+
+class DonationCube:
+    def __init__(self, cells=None, registers=None, p=CUBE_HLL_PRECISION):
+        self.p = p
+        if cells is None:
+            cells = pd.DataFrame({dim: pd.Series(dtype=np.int64 if dim == 'hour' else object) for dim in CUBE_DIMENSIONS})
+            cells = cells.assign(count=pd.Series(dtype=np.int64), wei_sum=pd.Series(dtype=float), usd_sum=pd.Series(dtype=float))
+        self.cells = cells
+        # Sparse HyperLogLog registers per cell as (cell, register index, rank) arrays
+        empty = np.zeros(0, dtype=np.int64)
+        self.registers = registers if registers is not None else (empty, empty, np.zeros(0, dtype=np.uint8))
+
+    @classmethod
+    def from_frame(cls, df, timestamp_column, p=CUBE_HLL_PRECISION):
+        frame = pd.DataFrame({
+            'origin_chain': key_column(df, 'origin_chain'),
+            'destination_chain': key_column(df, 'destination_chain'),
+            'round_id': key_column(df, 'round_id'),
+            'hour': pd.to_numeric(df[timestamp_column], errors='coerce').fillna(0).astype(np.int64) // 3600 * 3600,
+            'recipient_id': df['recipient_id'].astype(str),
+            'wei': pd.to_numeric(df['amount'], errors='coerce').astype(float),
+            'usd': pd.to_numeric(df['amount_usd'], errors='coerce') if 'amount_usd' in df else np.nan,
+        })
+        frame = frame[frame['wei'].notna()]
+        donors = df.loc[frame.index, 'donor']
+
+        grouped = frame.groupby(CUBE_DIMENSIONS, sort=False)
+        cell_ids = grouped.ngroup().to_numpy()
+        cells = grouped.agg(count=('wei', 'size'), wei_sum=('wei', 'sum'), usd_sum=('usd', 'sum')).reset_index()
+
+        idx, rank = hll_register_updates(donors, p)
+        return cls(cells, compact_registers(cell_ids, idx, rank, 1 << p), p)
+
+    def update(self, other):
+        if other.p != self.p:
+            raise ValueError(f"Cannot merge cubes with HyperLogLog precision {self.p} and {other.p}")
+        cells = pd.concat([self.cells, other.cells], ignore_index=True)
+        grouped = cells.groupby(CUBE_DIMENSIONS, sort=False)
+        cell_ids = grouped.ngroup().to_numpy()
+        registers = compact_registers(
+            cell_ids[np.concatenate([self.registers[0], other.registers[0] + len(self.cells)])],
+            np.concatenate([self.registers[1], other.registers[1]]),
+            np.concatenate([self.registers[2], other.registers[2]]),
+            1 << self.p,
+        )
+        return DonationCube(grouped[['count', 'wei_sum', 'usd_sum']].sum().reset_index(), registers, self.p)
+
+    def slice(self, by, filters=None):
+        cells = self.cells
+        mask = np.ones(len(cells), dtype=bool)
+        for column, values in (filters or {}).items():
+            values = values if isinstance(values, (list, tuple, set)) else [values]
+            mask &= cells[column].isin(key_column(pd.DataFrame({column: list(values)}), column)).to_numpy()
+        grouped = cells[mask].groupby(list(by), sort=True)
+        group_ids = np.full(len(cells), -1, dtype=np.int64)
+        group_ids[mask] = grouped.ngroup().to_numpy()
+        table = grouped[['count', 'wei_sum', 'usd_sum']].sum().reset_index()
+
+        register_cells, register_indexes, register_ranks = self.registers
+        selected = mask[register_cells]
+        groups, indexes, ranks = compact_registers(
+            group_ids[register_cells[selected]], register_indexes[selected], register_ranks[selected], 1 << self.p
+        )
+        merged = np.zeros((len(table), 1 << self.p), dtype=np.uint8)
+        merged[groups, indexes] = ranks
+        table['distinct_donors'] = hll_count(merged) if len(table) else []
+        table['count_pct'] = table['count'] / table['count'].sum() * 100
+        table['wei_pct'] = table['wei_sum'] / table['wei_sum'].sum() * 100
+        return table
+
+    def save(self, path):
+        np.savez(
+            path,
+            p=self.p,
+            register_cells=self.registers[0],
+            register_indexes=self.registers[1],
+            register_ranks=self.registers[2],
+            measures=self.cells[['count', 'wei_sum', 'usd_sum']].to_numpy(dtype=float),
+            **{f"dim_{dim}": self.cells[dim].to_numpy(dtype=str if dim != 'hour' else np.int64) for dim in CUBE_DIMENSIONS},
+        )
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        cells = pd.DataFrame({dim: data[f"dim_{dim}"] for dim in CUBE_DIMENSIONS})
+        cells[['count', 'wei_sum', 'usd_sum']] = data['measures']
+        cells['count'] = cells['count'].astype(np.int64)
+        registers = (data['register_cells'], data['register_indexes'], data['register_ranks'])
+        return cls(cells, registers, int(data['p']))
+
+
+def format_pct(values):
+    return pd.Series(np.char.mod('%.2f%%', values.to_numpy(dtype=float)), index=values.index)
+
+
+def benchmark_cube_slices(cube, slices, repeat=20):
+    rows = []
+    for by, filters in slices:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            cube.slice(by, filters)
+        rows.append({
+            'slice': ', '.join(by) + (f" where {filters}" if filters else ''),
+            'cells': len(cube.cells),
+            'latency_ms': round((time.perf_counter() - start) / repeat * 1000, 3),
+        })
+    return pd.DataFrame(rows)
@@ -0,0 +1,113 @@
+import math
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+
+class BloomFilter:
+    def __init__(self, path, capacity=10_000_000, error_rate=0.001):
+        self.path = path
+        self.num_hashes = max(1, math.ceil(-math.log2(error_rate)))
+        if os.path.exists(path):
+            self.bits = np.lib.format.open_memmap(path, mode='r+')
+        else:
+            num_bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+            self.bits = np.lib.format.open_memmap(path, mode='w+', dtype=np.uint8, shape=((num_bits + 7) // 8,))
+        self.num_bits = len(self.bits) * 8
+
+    def _positions(self, keys):
+        keys = pd.Series(keys, dtype=object)
+        h1 = pd.util.hash_pandas_object(keys, index=False, hash_key='gg20-bloom-hash1').to_numpy(dtype=np.uint64)
+        h2 = pd.util.hash_pandas_object(keys, index=False, hash_key='gg20-bloom-hash2').to_numpy(dtype=np.uint64) | np.uint64(1)
+        rounds = np.arange(self.num_hashes, dtype=np.uint64)
+        return (h1[:, None] + rounds[None, :] * h2[:, None]) % np.uint64(self.num_bits)
+
+    def might_contain(self, keys):
+        positions = self._positions(keys)
+        hits = (self.bits[positions >> np.uint64(3)] >> (positions & np.uint64(7)).astype(np.uint8)) & 1
+        return hits.all(axis=1)
+
+    def add(self, keys):
+        positions = self._positions(keys).ravel()
+        offsets = positions & np.uint64(7)
+        for bit in range(8):
+            self.bits[positions[offsets == bit] >> np.uint64(3)] |= np.uint8(1 << bit)
+        self.bits.flush()
+
+
+class DonationIndex:
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS donations ("
+            "key TEXT PRIMARY KEY, batch TEXT NOT NULL, source TEXT NOT NULL"
+            ") WITHOUT ROWID"
+        )
+
+    def lookup(self, keys):
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS lookup_keys (key TEXT PRIMARY KEY)")
+        self.conn.execute("DELETE FROM lookup_keys")
+        self.conn.executemany("INSERT OR IGNORE INTO lookup_keys VALUES (?)", ((k,) for k in keys))
+        rows = self.conn.execute(
+            "SELECT d.key, d.batch, d.source FROM donations d JOIN lookup_keys l ON d.key = l.key"
+        ).fetchall()
+        return pd.DataFrame(rows, columns=['key', 'seen_batch', 'seen_source'])
+
+    def add(self, keys, batch, source):
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO donations VALUES (?, ?, ?)", ((k, batch, source) for k in keys)
+        )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+class DonationDeduplicator:
+    def __init__(self, directory='dedup_index', capacity=10_000_000, error_rate=0.001):
+        os.makedirs(directory, exist_ok=True)
+        self.bloom = BloomFilter(os.path.join(directory, 'bloom.npy'), capacity, error_rate)
+        self.index = DonationIndex(os.path.join(directory, 'donations.sqlite'))
+
+    def _prior(self, keys, batch, source):
+        seen = pd.DataFrame({'seen_batch': None, 'seen_source': None}, index=keys.index)
+        candidates = pd.Series(self.bloom.might_contain(keys), index=keys.index)
+        if candidates.any():
+            prior = self.index.lookup(keys[candidates].tolist()).set_index('key')
+            # Rows this (batch, source) already registered on an earlier run are not duplicates
+            prior = prior[(prior['seen_batch'] != batch) | (prior['seen_source'] != source)]
+            matched = candidates & keys.isin(prior.index)
+            seen.loc[matched, ['seen_batch', 'seen_source']] = prior.loc[keys[matched], ['seen_batch', 'seen_source']].to_numpy()
+        return seen
+
+    def check(self, df, batch, source, tx_hash_column, log_index_column=None):
+        log_index = df[log_index_column].fillna(-1).astype(int).astype(str) if log_index_column else pd.Series('-1', index=df.index)
+        tx_keys = (df['destination_chain'].astype(str) + ':' + df[tx_hash_column].str.lower()).reset_index(drop=True)
+        log_index = log_index.reset_index(drop=True)
+        keys = tx_keys + ':' + log_index
+        # Without a log index a row can only be matched on its tx, so it is checked against the tx of every
+        # earlier row, and rows with a log index are checked against earlier rows that had none
+        fallback_keys = tx_keys + (log_index == '-1').map({True: ':*', False: ':-1'})
+
+        seen = self._prior(keys, batch, source)
+        fallback = self._prior(fallback_keys, batch, source)
+        unmatched = seen['seen_source'].isna()
+        seen.loc[unmatched] = fallback.loc[unmatched].to_numpy()
+        in_batch = keys.duplicated()
+        seen.loc[in_batch, ['seen_batch', 'seen_source']] = [batch, source]
+
+        is_duplicate = seen['seen_source'].notna().to_numpy()
+        new_keys = pd.concat([keys[~is_duplicate], tx_keys[~is_duplicate] + ':*'], ignore_index=True)
+        self.index.add(new_keys, batch, source)
+        self.bloom.add(new_keys)
+
+        duplicates = df[is_duplicate].copy()
+        duplicates['dedup_key'] = keys[is_duplicate].to_numpy()
+        duplicates['seen_batch'] = seen.loc[is_duplicate, 'seen_batch'].to_numpy()
+        duplicates['seen_source'] = seen.loc[is_duplicate, 'seen_source'].to_numpy()
+        return df[~is_duplicate], duplicates
+
+    def close(self):
+        self.index.close()
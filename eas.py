@@ -0,0 +1,183 @@
+import json
+import os
+import queue
+import threading
+import time
+
+import pandas as pd
+import requests
+
+
+EAS_GRAPHQL_URLS = {
+    '42161': 'https://arbitrum.easscan.org/graphql',
+    '10': 'https://optimism.easscan.org/graphql',
+}
+EAS_ATTESTERS = {
+    '42161': '0xaA098E5c9B002F815d7c9756BCfce0fC18B3F362',
+    '10': '0xd82BDb8391109f8BaD393Ff2CDa9E7Cd56F8239C',
+}
+# UIDs of the GG20 donation schema per chain (see CONTRACTS.md); the attester alone is used when unset
+EAS_SCHEMA_IDS = {
+    '42161': os.environ.get('ARBITRUM_EAS_SCHEMA_ID'),
+    '10': os.environ.get('OPTIMISM_EAS_SCHEMA_ID'),
+}
+ATTESTATION_COLUMNS = ['attester', 'data', 'recipient', 'txid', 'id', 'time', 'timeCreated']
+ATTESTATIONS_QUERY = """
+query Attestations($where: AttestationWhereInput, $take: Int, $skip: Int, $cursor: AttestationWhereUniqueInput) {
+  attestations(where: $where, take: $take, skip: $skip, cursor: $cursor, orderBy: [{ time: asc }, { id: asc }]) {
+    attester
+    data
+    recipient
+    txid
+    id
+    time
+    timeCreated
+  }
+}
+"""
+
+
+def fetch_attestation_page(url, attester, schema_id=None, after_id=None, page_size=1000, session=None):
+    where = {'attester': {'equals': attester}}
+    if schema_id:
+        where['schemaId'] = {'equals': schema_id}
+    variables = {'where': where, 'take': page_size}
+    if after_id:
+        variables.update({'cursor': {'id': after_id}, 'skip': 1})
+
+    response = (session or requests).post(url, json={'query': ATTESTATIONS_QUERY, 'variables': variables}, timeout=60)
+    response.raise_for_status()
+    payload = response.json()
+    if payload.get('errors'):
+        raise RuntimeError(f"EAS query failed: {payload['errors']}")
+    return payload['data']['attestations']
+
+
+def _load_resume_state(path):
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {}
+
+
+def _resume_key(chain, attester, schema_id=None):
+    # A cursor is only valid for the query it came from, so it is stored per (chain, attester, schema)
+    return f"{chain}:{attester.lower()}:{(schema_id or '').lower()}"
+
+
+def _save_resume_state(path, state):
+    if path:
+        with open(path + '.tmp', 'w') as f:
+            json.dump(state, f)
+        os.replace(path + '.tmp', path)
+
+
+def stream_attestations(chains, schema_ids=EAS_SCHEMA_IDS, urls=EAS_GRAPHQL_URLS, attesters=EAS_ATTESTERS,
+                        state_path='eas_resume.json', page_size=1000, decode=None, max_pages=None):
+    schema_ids = schema_ids or {}
+    state = _load_resume_state(state_path)
+    keys = {chain: _resume_key(chain, attesters[chain], schema_ids.get(chain)) for chain in chains}
+    pages = queue.Queue(maxsize=8)
+    done = object()
+    stop = threading.Event()
+
+    def put(item):
+        # Give up once the consumer has stopped instead of blocking on a full queue forever
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def crawl(chain):
+        after_id = state.get(keys[chain])
+        fetched = 0
+        try:
+            with requests.Session() as session:
+                while not stop.is_set() and (max_pages is None or fetched < max_pages):
+                    rows = fetch_attestation_page(
+                        urls[chain], attesters[chain], schema_ids.get(chain), after_id, page_size, session
+                    )
+                    if not rows:
+                        break
+                    after_id = rows[-1]['id']
+                    fetched += 1
+                    if not put((chain, rows)) or len(rows) < page_size:
+                        break
+        except Exception as e:
+            put((chain, e))
+        finally:
+            put((chain, done))
+
+    # Pagination is sequential per chain, so chains are crawled concurrently
+    threads = [threading.Thread(target=crawl, args=(chain,), daemon=True) for chain in chains]
+    for thread in threads:
+        thread.start()
+
+    remaining = len(threads)
+    failures = {}
+    try:
+        while remaining:
+            chain, rows = pages.get()
+            if rows is done:
+                remaining -= 1
+                continue
+            if isinstance(rows, Exception):
+                failures[chain] = rows
+                continue
+            page = pd.DataFrame(rows, columns=ATTESTATION_COLUMNS)
+            page['destination_chain'] = chain
+            if decode is not None:
+                page = decode(page)
+            yield page
+            # Only advance the resume cursor once the consumer has taken the page
+            state[keys[chain]] = rows[-1]['id']
+            _save_resume_state(state_path, state)
+    finally:
+        # A consumer that stops early (break, error, close) releases the crawlers and drops their queued pages
+        stop.set()
+        while True:
+            try:
+                pages.get_nowait()
+            except queue.Empty:
+                break
+
+    # Pages consumed before the failure are kept and the cursor points past them, so a rerun resumes there
+    if failures:
+        raise RuntimeError(
+            "Error fetching attestations: " + ', '.join(f"chain {chain}: {e}" for chain, e in failures.items())
+        ) from next(iter(failures.values()))
+
+
+def fetch_attestations(chains, **kwargs):
+    start = time.perf_counter()
+    pages = list(stream_attestations(chains, **kwargs))
+    elapsed = time.perf_counter() - start
+    attestations = pd.concat(pages, ignore_index=True) if pages else pd.DataFrame(columns=ATTESTATION_COLUMNS + ['destination_chain'])
+    print(f"Fetched {len(attestations)} attestations in {len(pages)} pages, {elapsed:.2f}s ({len(attestations) / max(elapsed, 1e-9):.0f} records/s)")
+    return attestations
+
+
+def sync_attestation_csvs(chain_files, state_path='eas_resume.json', **kwargs):
+    # Without a saved cursor, resume after the newest attestation already in the downloaded file
+    attesters = kwargs.get('attesters', EAS_ATTESTERS)
+    schema_ids = kwargs.get('schema_ids', EAS_SCHEMA_IDS) or {}
+    state = _load_resume_state(state_path)
+    for chain, path in chain_files.items():
+        key = _resume_key(chain, attesters[chain], schema_ids.get(chain))
+        if key not in state and os.path.exists(path):
+            existing = pd.read_csv(path, index_col=False)
+            if not existing.empty:
+                state[key] = existing.sort_values(['time', 'id'])['id'].iloc[-1]
+    _save_resume_state(state_path, state)
+
+    appended = 0
+    for page in stream_attestations(list(chain_files), state_path=state_path, **kwargs):
+        chain = page['destination_chain'].iloc[0]
+        path = chain_files[chain]
+        page[ATTESTATION_COLUMNS].to_csv(path, mode='a', header=not os.path.exists(path), index=False)
+        appended += len(page)
+    print(f"Appended {appended} new attestations")
+    return appended
@@ -0,0 +1,100 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+from eas import EAS_ATTESTERS, fetch_attestations
+
+
+def synthetic_attestations(count, attester, schema_id='0x' + '11' * 32, start_time=1713196770):
+    return [
+        {
+            'attester': attester,
+            'data': '0x' + format(i, '064x') * 6,
+            'recipient': '0x' + format(i, '040x'),
+            'txid': '0x' + format(i, '064x'),
+            'id': '0x' + format(i + 1, '064x'),
+            'time': str(start_time + i // 3),
+            'timeCreated': str(start_time + i // 3),
+            'schemaId': schema_id,
+        }
+        for i in range(count)
+    ]
+
+
+# Stand-in for the EAS indexer: answers the attestations(where, take, skip, cursor) query at /<chain id>/graphql
+class MockEASServer:
+    def __init__(self, attestations, latency=0.0, host='127.0.0.1', port=0):
+        self.latency = latency
+        self.attestations = {
+            chain: sorted(rows, key=lambda r: (int(r['time']), r['id'])) for chain, rows in attestations.items()
+        }
+        self.requests = 0
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def urls(self):
+        host, port = self.server.server_address
+        return {chain: f"http://{host}:{port}/{chain}/graphql" for chain in self.attestations}
+
+    def query(self, chain, variables):
+        where = variables.get('where') or {}
+        rows = self.attestations.get(chain, [])
+        for field, condition in where.items():
+            rows = [r for r in rows if str(r.get(field, '')).lower() == str(condition['equals']).lower()]
+        start = 0
+        if variables.get('cursor'):
+            ids = [r['id'] for r in rows]
+            start = ids.index(variables['cursor']['id']) + variables.get('skip', 0)
+        return rows[start:start + variables.get('take', 100)]
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                chain = self.path.strip('/').split('/')[0]
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                mock.requests += 1
+                if mock.latency:
+                    time.sleep(mock.latency)
+                payload = json.dumps({'data': {'attestations': mock.query(chain, body.get('variables') or {})}}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == '__main__':
+    attestations = {chain: synthetic_attestations(50_000, attester) for chain, attester in EAS_ATTESTERS.items()}
+    with MockEASServer(attestations, latency=0.005) as mock, tempfile.TemporaryDirectory() as tmp:
+        state_path = os.path.join(tmp, 'eas_resume.json')
+        schema_ids = {chain: '0x' + '11' * 32 for chain in attestations}
+        common = dict(urls=mock.urls, schema_ids=schema_ids, state_path=state_path, page_size=1000)
+
+        first = fetch_attestations(list(attestations), max_pages=10, **common)
+        resumed = fetch_attestations(list(attestations), **common)
+        fetched = pd.concat([first, resumed], ignore_index=True)
+
+        expected = sum(len(rows) for rows in attestations.values())
+        print(f"Interrupted run: {len(first)} records, resumed run: {len(resumed)} records")
+        print(f"Total {len(fetched)} / {expected}, duplicate ids: {fetched.duplicated(['destination_chain', 'id']).sum()}, requests: {mock.requests}")
@@ -0,0 +1,92 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+
+PRICE_CACHE_DIR = 'price_cache'
+EXPLORER_TIMESTAMP_COLUMN = 'UnixTimestamp'
+EXPLORER_PRICE_COLUMN = 'Historical $Price/ETH'
+
+# (chain id, lowercase token address) -> (price series, decimals)
+TOKEN_PRICE_SERIES = {
+    ('42161', '0xeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeee'): ('ETH', 18),
+    ('42161', '0x82af49447d8a07e3bd95bd0d56f35241523fbab1'): ('ETH', 18),
+    ('10', '0xeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeee'): ('ETH', 18),
+    ('10', '0x4200000000000000000000000000000000000006'): ('ETH', 18),
+}
+
+
+def price_cache_path(series, cache_dir=PRICE_CACHE_DIR):
+    return os.path.join(cache_dir, f"{series}.csv")
+
+
+def update_price_cache(explorer_files, series='ETH', cache_dir=PRICE_CACHE_DIR):
+    frames = [
+        pd.read_csv(path, index_col=False, usecols=[EXPLORER_TIMESTAMP_COLUMN, EXPLORER_PRICE_COLUMN])
+        for path in explorer_files
+    ]
+    path = price_cache_path(series, cache_dir)
+    if os.path.exists(path):
+        frames.append(
+            pd.read_csv(path).rename(columns={'timestamp': EXPLORER_TIMESTAMP_COLUMN, 'price_usd': EXPLORER_PRICE_COLUMN})
+        )
+    prices = pd.concat(frames, ignore_index=True).dropna()
+    prices = pd.DataFrame({
+        'timestamp': prices[EXPLORER_TIMESTAMP_COLUMN].astype(np.int64),
+        'price_usd': prices[EXPLORER_PRICE_COLUMN].astype(float),
+    })
+    prices = prices.drop_duplicates('timestamp', keep='last').sort_values('timestamp', ignore_index=True)
+    os.makedirs(cache_dir, exist_ok=True)
+    prices.to_csv(path, index=False)
+    return prices
+
+
+def load_price_series(series_names, cache_dir=PRICE_CACHE_DIR):
+    frames = []
+    for series in series_names:
+        prices = pd.read_csv(price_cache_path(series, cache_dir), dtype={'timestamp': np.int64, 'price_usd': float})
+        prices['price_series'] = series
+        frames.append(prices)
+    return pd.concat(frames, ignore_index=True).sort_values('timestamp', ignore_index=True)
+
+
+def attach_usd_values(df, timestamp_column, cache_dir=PRICE_CACHE_DIR):
+    tokens = pd.DataFrame(
+        [(chain, token, series, decimals) for (chain, token), (series, decimals) in TOKEN_PRICE_SERIES.items()],
+        columns=['_chain', '_token', 'price_series', '_decimals'],
+    )
+    valued = df.drop(columns=['price_series', 'price_usd', 'amount_usd'], errors='ignore')
+    valued['_chain'] = valued['destination_chain'].astype(str)
+    valued['_token'] = valued['token'].astype(str).str.lower()
+    valued = valued.merge(tokens, on=['_chain', '_token'], how='left').set_index(df.index)
+    # Unknown tokens keep NaN decimals so they stay unvalued instead of being scaled as 18-decimal tokens
+    decimals = valued['_decimals'].to_numpy(dtype=float)
+
+    known = sorted(set(valued['price_series'].dropna()))
+    prices = load_price_series(known, cache_dir) if known else pd.DataFrame(columns=['timestamp', 'price_usd', 'price_series'])
+
+    valued['_row'] = np.arange(len(valued))
+    valued['_timestamp'] = pd.to_numeric(valued[timestamp_column], errors='coerce').astype('Int64')
+    priced = valued.dropna(subset=['_timestamp', 'price_series']).astype({'_timestamp': np.int64})
+    priced = pd.merge_asof(
+        priced.sort_values('_timestamp')[['_row', '_timestamp', 'price_series']],
+        prices.rename(columns={'timestamp': '_timestamp'}),
+        on='_timestamp',
+        by='price_series',
+        direction='backward',
+    )
+
+    price_usd = np.full(len(valued), np.nan)
+    price_usd[priced['_row'].to_numpy()] = priced['price_usd'].to_numpy()
+    amounts = pd.to_numeric(valued['amount'], errors='coerce').astype(float).to_numpy()
+    valued['price_usd'] = price_usd
+    valued['amount_usd'] = amounts / 10 ** decimals * price_usd
+
+    unpriced = valued[valued['amount_usd'].isna() & ~np.isnan(amounts)]
+    if not unpriced.empty:
+        reasons = np.where(unpriced['price_series'].isna(), 'token not in TOKEN_PRICE_SERIES', 'no cached price at or before timestamp')
+        counts = unpriced.groupby([unpriced['_chain'], unpriced['_token'], reasons]).size()
+        print(f"{len(unpriced)} of {len(valued)} rows have no USD value (excluded from USD sums and medians):")
+        print(counts.rename_axis(['chain', 'token', 'reason']).reset_index(name='rows').to_string(index=False))
+    return valued.drop(columns=['_row', '_timestamp', '_chain', '_token', '_decimals'])
@@ -0,0 +1,143 @@
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from sketches import key_column
+
+
+class QFRound:
+    def __init__(self, df, value_column='amount_usd'):
+        contributions = df[['donor', 'recipient_id', value_column]].dropna()
+        # Unpriced contributions (NaN value) cannot enter the QF sums; they are counted so callers can report them
+        self.excluded = len(df) - len(contributions)
+        donor_codes, self.donors = pd.factorize(contributions['donor'].astype(str).str.lower())
+        recipient_codes, self.recipients = pd.factorize(contributions['recipient_id'].astype(str).str.lower())
+        # coo -> csr sums repeated (donor, recipient) contributions, which QF treats as one
+        self.matrix = sparse.coo_matrix(
+            (contributions[value_column].to_numpy(dtype=float), (donor_codes, recipient_codes)),
+            shape=(len(self.donors), len(self.recipients)),
+        ).tocsr()
+        self.value_column = value_column
+        self.sqrt_sums = np.asarray(self.matrix.sqrt().sum(axis=0)).ravel()
+        self.totals = np.asarray(self.matrix.sum(axis=0)).ravel()
+
+    def matching(self, pool=None, cap=None, sqrt_sums=None, totals=None):
+        sqrt_sums = self.sqrt_sums if sqrt_sums is None else sqrt_sums
+        totals = self.totals if totals is None else totals
+        ideal = np.maximum(sqrt_sums ** 2 - totals, 0)
+        return allocate_pool(ideal, pool, cap)
+
+    def what_if(self, delta, sign=-1, pool=None, cap=None):
+        delta = delta[['donor', 'recipient_id', self.value_column]].dropna()
+        donor_keys = delta['donor'].astype(str).str.lower()
+        recipient_keys = delta['recipient_id'].astype(str).str.lower()
+        # Sum the delta per (donor, recipient) pair before comparing against the baseline pair totals
+        pairs = delta.groupby([donor_keys, recipient_keys])[self.value_column].sum()
+        donors = self.donors.get_indexer(pairs.index.get_level_values(0))
+        recipients = self.recipients.get_indexer(pairs.index.get_level_values(1))
+
+        new_recipients = pd.Index(pairs.index.get_level_values(1)[recipients == -1]).unique()
+        recipients[recipients == -1] = len(self.recipients) + new_recipients.get_indexer(
+            pairs.index.get_level_values(1)[recipients == -1]
+        )
+        size = len(self.recipients) + len(new_recipients)
+
+        known = (donors >= 0) & (recipients < len(self.recipients))
+        before = np.zeros(len(pairs))
+        before[known] = np.asarray(self.matrix[donors[known], recipients[known]]).ravel()
+        after = np.maximum(before + sign * pairs.to_numpy(dtype=float), 0)
+
+        sqrt_sums = np.concatenate([self.sqrt_sums, np.zeros(len(new_recipients))])
+        totals = np.concatenate([self.totals, np.zeros(len(new_recipients))])
+        sqrt_sums += np.bincount(recipients, np.sqrt(after) - np.sqrt(before), minlength=size)
+        totals += np.bincount(recipients, after - before, minlength=size)
+        return self.matching(pool, cap, sqrt_sums, totals), self.recipients.append(new_recipients)
+
+
+def allocate_pool(ideal, pool=None, cap=None):
+    if pool is None or ideal.sum() == 0:
+        return ideal
+    matching = ideal / ideal.sum() * pool
+    if cap is None:
+        return matching
+    # Clip recipients at cap * pool and hand the excess to the uncapped ones until nothing is over the cap
+    limit = cap * pool
+    capped = np.zeros(len(matching), dtype=bool)
+    while True:
+        over = ~capped & (matching > limit)
+        if not over.any():
+            return matching
+        capped |= over
+        excess = (matching[over] - limit).sum()
+        matching[over] = limit
+        weights = np.where(capped, 0, ideal)
+        if weights.sum() == 0:
+            return matching
+        matching += excess * weights / weights.sum()
+
+
+def estimate_round_matching(others, ours, matching_pools=None, matching_caps=None, value_column='amount_usd'):
+    matching_pools = matching_pools or {}
+    matching_caps = matching_caps or {}
+    baseline = pd.concat([others, ours], ignore_index=True)
+    keys = [key_column(baseline, 'destination_chain'), key_column(baseline, 'round_id')]
+    our_keys = [key_column(ours, 'destination_chain'), key_column(ours, 'round_id')]
+    our_groups = dict(list(ours.groupby(our_keys)))
+    unknown = (set(matching_pools) | set(matching_caps)) - set(zip(*keys))
+    if unknown:
+        print(f"Matching pools or caps configured for rounds without contributions: {sorted(unknown)}")
+
+    rows = []
+    for (chain, round_id), round_df in baseline.groupby(keys):
+        qf_round = QFRound(round_df, value_column)
+        pool = matching_pools.get((chain, round_id))
+        cap = matching_caps.get((chain, round_id))
+        with_ours = qf_round.matching(pool, cap)
+        our_df = our_groups.get((chain, round_id), ours.iloc[:0])
+        without_ours, _ = qf_round.what_if(our_df, sign=-1, pool=pool, cap=cap)
+        rows.append({
+            'destination_chain': chain,
+            'round_id': round_id,
+            'contributions': len(round_df),
+            'excluded_contributions': qf_round.excluded,
+            'our_contributions': len(our_df),
+            'our_amount': our_df[value_column].sum(),
+            'cap': cap,
+            'matching': with_ours.sum(),
+            'matching_without_ours': without_ours.sum(),
+            # With a fixed pool the total does not change, so count the matching our donations pulled to recipients
+            'matching_earned': np.clip(with_ours - without_ours[:len(with_ours)], 0, None).sum(),
+        })
+    return pd.DataFrame(rows)
+
+
+def benchmark_qf(contributions=5_000_000, donors=500_000, recipients=2_000, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'donor': rng.integers(0, donors, contributions).astype(str),
+        'recipient_id': rng.zipf(1.5, contributions) % recipients,
+        'amount_usd': rng.lognormal(1, 1.5, contributions),
+    })
+    ours = df.sample(frac=0.01, random_state=seed)
+
+    start = time.perf_counter()
+    qf_round = QFRound(df)
+    built = time.perf_counter()
+    matching = qf_round.matching(pool=1_000_000, cap=0.1)
+    matched = time.perf_counter()
+    qf_round.what_if(ours, sign=-1, pool=1_000_000, cap=0.1)
+    what_if = time.perf_counter()
+    return pd.DataFrame([{
+        'contributions': contributions,
+        'recipients': len(matching),
+        'build_s': round(built - start, 3),
+        'matching_s': round(matched - built, 3),
+        'what_if_s': round(what_if - matched, 3),
+        'what_if_rows': len(ours),
+    }])
+
+
+if __name__ == '__main__':
+    print(benchmark_qf())
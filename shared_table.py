@@ -0,0 +1,221 @@
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+
+SHARED_TABLE_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
+
+def _table_path(name, directory=SHARED_TABLE_DIR):
+    return os.path.join(directory, f"gg20-table-{name}")
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class SharedTable:
+    def __init__(self, name, directory=SHARED_TABLE_DIR):
+        self.name = name
+        self.path = _table_path(name, directory)
+        with open(os.path.join(self.path, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.columns = list(self.meta['columns'])
+        self._arrays = {}
+        self._categories = {}
+
+    def __len__(self):
+        return self.meta['rows']
+
+    def array(self, column):
+        # Read-only memory maps: every process attached to the table shares the same page cache pages
+        if column not in self._arrays:
+            self._arrays[column] = np.load(os.path.join(self.path, f"{column}.npy"), mmap_mode='r')
+        return self._arrays[column]
+
+    def categories(self, column):
+        # Category strings stay in a fixed-width bytes array on the shared mapping and are decoded only on lookup
+        info = self.meta['columns'][column]
+        if info['dtype'] != 'category':
+            return None
+        if column not in self._categories:
+            if info['categories'] == 0:
+                self._categories[column] = np.empty(0, dtype='S1')
+            else:
+                self._categories[column] = np.load(os.path.join(self.path, f"{column}.categories.npy"), mmap_mode='r')
+        return self._categories[column]
+
+    def column(self, column):
+        values = self.array(column)
+        categories = self.categories(column)
+        if categories is None:
+            return pd.Series(values, name=column, copy=False)
+        return pd.Series(pd.Categorical.from_codes(values, [c.decode() for c in categories]), name=column)
+
+    def frame(self, columns=None):
+        return pd.concat([self.column(column) for column in (columns or self.columns)], axis=1)
+
+
+def publish_table(df, name, directory=SHARED_TABLE_DIR):
+    path = _table_path(name, directory)
+    staging = path + f".{os.getpid()}.tmp"
+    os.makedirs(staging)
+    columns = {}
+    for column in df.columns:
+        values = df[column]
+        numeric = pd.to_numeric(values, errors='coerce') if values.dtype == object else values
+        if pd.api.types.is_numeric_dtype(numeric) and numeric.notna().sum() == values.notna().sum():
+            # uint256 amounts do not fit an integer dtype, so they are shared as float64
+            array = numeric.to_numpy(dtype=float if numeric.dtype == object else None)
+            columns[column] = {'dtype': str(array.dtype)}
+        else:
+            codes, categories = pd.factorize(values.astype('string'), use_na_sentinel=True)
+            array = codes.astype(np.int32)
+            columns[column] = {'dtype': 'category', 'categories': len(categories)}
+            if len(categories):
+                np.save(os.path.join(staging, f"{column}.categories.npy"), np.array([str(c).encode() for c in categories]))
+        np.save(os.path.join(staging, f"{column}.npy"), np.ascontiguousarray(array))
+    with open(os.path.join(staging, 'meta.json'), 'w') as f:
+        json.dump({'rows': len(df), 'owner_pid': os.getpid(), 'created': time.time(), 'columns': columns}, f)
+
+    # Each rename is atomic, so readers never see a half-written table. The old table is moved aside before it is
+    # deleted: readers that already mapped its columns keep valid files, and only a reader attaching between the
+    # two renames finds no table at all
+    retired = path + f".{os.getpid()}.old"
+    if os.path.exists(path):
+        os.rename(path, retired)
+    os.rename(staging, path)
+    shutil.rmtree(retired, ignore_errors=True)
+    return SharedTable(name, directory)
+
+
+def unpublish_table(name, directory=SHARED_TABLE_DIR):
+    shutil.rmtree(_table_path(name, directory), ignore_errors=True)
+
+
+def cleanup_stale_tables(directory=SHARED_TABLE_DIR):
+    removed = []
+    for entry in os.listdir(directory):
+        if not entry.startswith('gg20-table-'):
+            continue
+        path = os.path.join(directory, entry)
+        meta_path = os.path.join(path, 'meta.json')
+        owner = None
+        if entry.endswith(('.tmp', '.old')):
+            # Staging and retired directories belong to the publishing process named in the entry
+            owner = int(entry.rsplit('.', 2)[-2])
+        elif os.path.exists(meta_path):
+            with open(meta_path) as f:
+                owner = json.load(f).get('owner_pid')
+        if owner is None or not _pid_alive(owner):
+            shutil.rmtree(path, ignore_errors=True)
+            removed.append(entry)
+    return removed
+
+
+def aggregate_shared(name, by, value, directory=SHARED_TABLE_DIR):
+    table = SharedTable(name, directory)
+    keys = table.array(by)
+    values = table.array(value)
+    valid = keys >= 0 if table.categories(by) is not None else ~np.isnan(keys)
+    codes, uniques = pd.factorize(keys[valid])
+    sums = np.bincount(codes, np.nan_to_num(values[valid]))
+    counts = np.bincount(codes)
+    categories = table.categories(by)
+    labels = [categories[u].decode() for u in uniques] if categories is not None else uniques
+    return pd.DataFrame({by: labels, f"{value}_sum": sums, 'count': counts})
+
+
+def _memory_usage():
+    # Proportional set size splits shared pages between the processes mapping them
+    usage = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            field, _, rest = line.partition(':')
+            if field in ('Rss', 'Pss'):
+                usage[field.lower() + '_mb'] = int(rest.split()[0]) / 1024
+    return usage
+
+
+def _idle_worker(_):
+    time.sleep(0.5)
+    return _memory_usage()
+
+
+def _shared_worker(name, directory):
+    table = SharedTable(name, directory)
+    for column in table.columns:
+        table.array(column).sum()
+        if table.categories(column) is not None:
+            table.categories(column).view(np.uint8).sum()
+    time.sleep(0.5)
+    return _memory_usage()
+
+
+def _pickled_worker(df):
+    # Unpickling the argument already materialized every column in this worker
+    len(df)
+    time.sleep(0.5)
+    return _memory_usage()
+
+
+def _worker_memory(workers, func, *args):
+    # Spawned workers start clean, so nothing is shared with the parent through fork
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        idle = list(pool.map(_idle_worker, range(workers)))
+        busy = list(pool.map(func, *[[arg] * workers for arg in args]))
+    return {
+        'data_pss_mb': sum(r['pss_mb'] for r in busy) - sum(r['pss_mb'] for r in idle),
+        'max_rss_mb': max(r['rss_mb'] for r in busy),
+    }
+
+
+def _hex_strings(rng, count, nbytes):
+    raw = rng.integers(0, 256, (count, nbytes), dtype=np.uint8)
+    return ['0x' + row.tobytes().hex() for row in raw]
+
+
+def benchmark_shared_table(rows=1_000_000, workers=8, directory=SHARED_TABLE_DIR):
+    rng = np.random.default_rng(0)
+    donors = np.array(_hex_strings(rng, rows // 20, 20), dtype=object)
+    df = pd.DataFrame({
+        'Txhash': _hex_strings(rng, rows, 32),
+        'donor': donors[rng.integers(0, len(donors), rows)],
+        'amount': rng.lognormal(36, 2, rows),
+        'amount_usd': rng.lognormal(1, 1.5, rows),
+        'round_id': rng.integers(0, 40, rows),
+        'log_index': rng.integers(0, 500, rows),
+        'timestamp': rng.integers(1713000000, 1714500000, rows),
+    })
+    name = f"benchmark-{os.getpid()}"
+    publish_table(df, name, directory)
+    try:
+        shared = _worker_memory(workers, _shared_worker, name, directory)
+    finally:
+        unpublish_table(name, directory)
+    pickled = _worker_memory(workers, _pickled_worker, df)
+
+    data_mb = df.memory_usage(index=False, deep=True).sum() / 2 ** 20
+    return pd.DataFrame([
+        {'mode': mode, 'workers': workers, 'table_mb': round(data_mb, 1),
+         'worker_data_pss_mb': round(result['data_pss_mb'], 1), 'copies': round(result['data_pss_mb'] / data_mb, 2),
+         'max_rss_mb': round(result['max_rss_mb'], 1)}
+        for mode, result in [('memory-mapped', shared), ('pickled', pickled)]
+    ])
+
+
+if __name__ == '__main__':
+    print(benchmark_shared_table())
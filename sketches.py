@@ -0,0 +1,323 @@
+import base64
+import json
+
+import numpy as np
+import pandas as pd
+
+
+SKETCH_KEYS = ['destination_chain', 'round_id', 'recipient_id']
+ID_COLUMNS = ['origin_chain', 'destination_chain', 'round_id']
+
+
+def key_column(df, column):
+    # Chain and round ids turn float when a NaN lands in the column; normalize so 23.0 and '23' key alike
+    if column in ID_COLUMNS:
+        ids = pd.to_numeric(df[column], errors='coerce').astype('Int64')
+        return ids.astype(str).where(ids.notna(), 'nan')
+    return df[column].astype(str)
+
+
+def _bit_length(values):
+    length = np.zeros(len(values), dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        mask = values >= np.uint64(1 << shift)
+        length += shift * mask
+        values = np.where(mask, values >> np.uint64(shift), values)
+    return length + (values > 0)
+
+
+def hll_register_updates(values, p):
+    values = pd.Series(values).astype(str).str.lower()
+    hashes = pd.util.hash_pandas_object(values, index=False).to_numpy(dtype=np.uint64)
+    idx = (hashes >> np.uint64(64 - p)).astype(np.int64)
+    rest = (hashes << np.uint64(p)) | np.uint64((1 << p) - 1)
+    # Rank is the position of the leftmost 1-bit in the remaining 64 - p bits
+    rank = (65 - _bit_length(rest)).astype(np.uint8)
+    return idx, rank
+
+
+def hll_count(registers):
+    registers = np.atleast_2d(registers)
+    m = registers.shape[1]
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m ** 2 / np.sum(np.power(2.0, -registers.astype(np.float64)), axis=1)
+    zeros = np.count_nonzero(registers == 0, axis=1)
+    small = (estimate <= 2.5 * m) & (zeros > 0)
+    estimate[small] = m * np.log(m / zeros[small])
+    return np.round(estimate).astype(np.int64)
+
+
+def compact_registers(cells, indexes, ranks, m):
+    # Keep one (cell, register) entry holding the max rank; most cells only touch a few registers
+    keys = cells.astype(np.int64) * m + indexes
+    order = np.argsort(keys, kind='stable')
+    keys, ranks = keys[order], ranks[order]
+    unique_keys, starts = np.unique(keys, return_index=True)
+    ranks = np.maximum.reduceat(ranks, starts) if len(ranks) else ranks
+    return unique_keys // m, unique_keys % m, ranks
+
+
+class HyperLogLog:
+    @classmethod
+    def from_registers(cls, p, indexes, ranks):
+        # Build from already compacted (index, rank) pairs, going dense when that is smaller
+        if len(indexes) * 3 > (1 << p):
+            registers = np.zeros(1 << p, dtype=np.uint8)
+            registers[indexes] = ranks
+            return cls(p, registers)
+        return cls(p, sparse=(indexes, ranks))
+
+    def __init__(self, p=12, registers=None, sparse=None):
+        self.p = p
+        self.m = 1 << p
+        self.registers = registers
+        # Small sketches keep only their touched registers as (index, rank) arrays until dense is cheaper
+        if registers is None and sparse is None:
+            sparse = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.uint8))
+        self.sparse = sparse if registers is None else None
+
+    def _add(self, indexes, ranks):
+        if self.registers is not None:
+            np.maximum.at(self.registers, indexes, ranks)
+            return
+        _, indexes, ranks = compact_registers(
+            np.zeros(len(self.sparse[0]) + len(indexes), dtype=np.int64),
+            np.concatenate([self.sparse[0], indexes]),
+            np.concatenate([self.sparse[1], ranks]),
+            self.m,
+        )
+        self.sparse = (indexes, ranks)
+        if len(indexes) * 3 > self.m:
+            self.registers = self.dense()
+            self.sparse = None
+
+    def dense(self):
+        if self.registers is not None:
+            return self.registers
+        registers = np.zeros(self.m, dtype=np.uint8)
+        registers[self.sparse[0]] = self.sparse[1]
+        return registers
+
+    def update(self, values):
+        values = pd.Series(values).dropna()
+        if values.empty:
+            return self
+        idx, rank = hll_register_updates(values, self.p)
+        self._add(idx, rank)
+        return self
+
+    def merge(self, other):
+        if other.p != self.p:
+            raise ValueError(f"Cannot merge HyperLogLog sketches with p={self.p} and p={other.p}")
+        if other.registers is not None:
+            return HyperLogLog(self.p, np.maximum(self.dense(), other.registers))
+        merged = HyperLogLog(self.p, None if self.registers is None else self.registers.copy(), self.sparse)
+        merged._add(*other.sparse)
+        return merged
+
+    def count(self):
+        return int(hll_count(self.dense())[0])
+
+    def to_dict(self):
+        if self.registers is not None:
+            return {'p': self.p, 'registers': base64.b64encode(self.registers.tobytes()).decode()}
+        return {
+            'p': self.p,
+            'indexes': base64.b64encode(self.sparse[0].astype(np.uint16).tobytes()).decode(),
+            'ranks': base64.b64encode(self.sparse[1].tobytes()).decode(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if 'registers' in data:
+            return cls(data['p'], np.frombuffer(base64.b64decode(data['registers']), dtype=np.uint8).copy())
+        indexes = np.frombuffer(base64.b64decode(data['indexes']), dtype=np.uint16).astype(np.int64)
+        ranks = np.frombuffer(base64.b64decode(data['ranks']), dtype=np.uint8).copy()
+        return cls(data['p'], sparse=(indexes, ranks))
+
+
+class KLLSketch:
+    def __init__(self, k=200, levels=None, n=0, seed=0):
+        self.k = k
+        self.levels = levels if levels is not None else [np.empty(0)]
+        self.n = n
+        # The generator is created on the first compaction; most partition sketches never compact
+        self._seed = seed
+        self._rng = None
+
+    @classmethod
+    def from_values(cls, values, k=200, seed=0):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) < k:
+            return cls(k, [values], len(values), seed)
+        return cls(k, seed=seed).update(values)
+
+    def _generator(self):
+        if self._rng is None:
+            self._rng = np.random.default_rng(self._seed)
+        return self._rng
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) >= self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                keep = items[-1:] if len(items) % 2 else items[:0]
+                items = items[:len(items) - len(keep)]
+                promoted = items[self._generator().integers(2)::2]
+                self.levels[level] = keep
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+                level = 0
+            else:
+                level += 1
+
+    def update(self, values):
+        values = pd.to_numeric(pd.Series(values), errors='coerce').dropna().to_numpy(dtype=np.float64)
+        if len(values):
+            self.levels[0] = np.concatenate([self.levels[0], values])
+            self.n += len(values)
+            self._compress()
+        return self
+
+    def merge(self, other):
+        merged = KLLSketch(self.k, [level.copy() for level in self.levels], self.n + other.n)
+        # Continue this sketch's coin flips so repeated merges do not replay the same seeded sequence
+        merged._rng = self._generator()
+        for level, items in enumerate(other.levels):
+            if level == len(merged.levels):
+                merged.levels.append(np.empty(0))
+            merged.levels[level] = np.concatenate([merged.levels[level], items])
+        merged._compress()
+        return merged
+
+    def quantile(self, q):
+        if self.n == 0:
+            return None
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2.0 ** h) for h, level in enumerate(self.levels)])
+        order = np.argsort(items)
+        cumulative = np.cumsum(weights[order])
+        position = np.searchsorted(cumulative, q * cumulative[-1], side='left')
+        return items[order][min(position, len(items) - 1)]
+
+    def median(self):
+        return self.quantile(0.5)
+
+    def to_dict(self):
+        return {'k': self.k, 'n': self.n, 'levels': [level.tolist() for level in self.levels]}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['k'], [np.asarray(level, dtype=np.float64) for level in data['levels']], data['n'])
+
+
+def _split_by_group(group_ids, values, num_groups):
+    order = np.argsort(group_ids, kind='stable')
+    bounds = np.cumsum(np.bincount(group_ids, minlength=num_groups))[:-1]
+    return np.split(values[order], bounds)
+
+
+def build_partition_sketches(df, keys=SKETCH_KEYS, p=12, k=200):
+    frame = df.dropna(subset=['amount'])
+    grouped = frame.groupby([key_column(frame, col) for col in keys], sort=True)
+    sizes = grouped.size()
+    counts = sizes.to_numpy()
+    group_ids = grouped.ngroup().to_numpy()
+    partitions = [key if isinstance(key, tuple) else (key,) for key in sizes.index]
+
+    # Registers for every partition in one pass, the same way DonationCube.from_frame builds its cells
+    has_donor = frame['donor'].notna().to_numpy()
+    idx, rank = hll_register_updates(frame['donor'][has_donor], p)
+    cells, idx, rank = compact_registers(group_ids[has_donor], idx, rank, 1 << p)
+    bounds = np.searchsorted(cells, np.arange(len(partitions) + 1))
+
+    amounts = _split_by_group(group_ids, frame['amount'].astype(float).to_numpy(), len(partitions))
+    usd = frame['amount_usd'] if 'amount_usd' in frame else pd.Series(np.nan, index=frame.index)
+    amounts_usd = _split_by_group(group_ids, pd.to_numeric(usd, errors='coerce').to_numpy(dtype=float), len(partitions))
+
+    sketches = {}
+    for seed, key in enumerate(partitions):
+        start, end = bounds[seed], bounds[seed + 1]
+        sketches[key] = {
+            'count': int(counts[seed]),
+            'donors': HyperLogLog.from_registers(p, idx[start:end], rank[start:end]),
+            'amount': KLLSketch.from_values(amounts[seed], k, seed),
+            'amount_usd': KLLSketch.from_values(amounts_usd[seed], k, seed),
+        }
+    return sketches
+
+
+def merge_partition_sketches(*sketch_sets, keys=SKETCH_KEYS, group_by=()):
+    positions = [keys.index(col) for col in group_by]
+    merged = {}
+    for sketches in sketch_sets:
+        for key, sketch in sketches.items():
+            group = tuple(key[i] for i in positions)
+            if group not in merged:
+                merged[group] = {'count': 0, 'donors': HyperLogLog(), 'amount': KLLSketch(), 'amount_usd': KLLSketch()}
+            merged[group]['count'] += sketch['count']
+            merged[group]['donors'] = merged[group]['donors'].merge(sketch['donors'])
+            merged[group]['amount'] = merged[group]['amount'].merge(sketch['amount'])
+            merged[group]['amount_usd'] = merged[group]['amount_usd'].merge(sketch['amount_usd'])
+    return merged
+
+
+def save_sketches(sketches, path):
+    payload = [
+        {
+            'key': list(key), 'count': s['count'], 'donors': s['donors'].to_dict(),
+            'amount': s['amount'].to_dict(), 'amount_usd': s['amount_usd'].to_dict(),
+        }
+        for key, s in sketches.items()
+    ]
+    with open(path, 'w') as f:
+        json.dump(payload, f)
+
+
+def load_sketches(path):
+    with open(path) as f:
+        payload = json.load(f)
+    return {
+        tuple(entry['key']): {
+            'count': entry['count'],
+            'donors': HyperLogLog.from_dict(entry['donors']),
+            'amount': KLLSketch.from_dict(entry['amount']),
+            'amount_usd': KLLSketch.from_dict(entry['amount_usd']) if 'amount_usd' in entry else KLLSketch(),
+        }
+        for entry in payload
+    }
+
+
+def sketch_error_report(df, *sketch_sets, keys=SKETCH_KEYS, group_by=()):
+    merged = merge_partition_sketches(*sketch_sets, keys=keys, group_by=group_by)
+    frame = df.dropna(subset=['amount'])
+    if group_by:
+        groups = frame.groupby([key_column(frame, col) for col in group_by], sort=True)
+    else:
+        groups = [((), frame)]
+    rows = []
+    for group, part in groups:
+        group = group if isinstance(group, tuple) else (group,)
+        sketch = merged[group]
+        exact_donors = part['donor'].nunique()
+        exact_median = part['amount'].astype(float).median()
+        approx_donors = sketch['donors'].count()
+        approx_median = sketch['amount'].median()
+        rows.append({
+            **dict(zip(group_by, group)),
+            'exact_donors': exact_donors,
+            'approx_donors': approx_donors,
+            'donors_error_pct': abs(approx_donors - exact_donors) / max(exact_donors, 1) * 100,
+            'exact_median': exact_median,
+            'approx_median': approx_median,
+            'median_error_pct': abs(approx_median - exact_median) / exact_median * 100 if exact_median else 0.0,
+        })
+    return pd.DataFrame(rows)
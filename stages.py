@@ -0,0 +1,105 @@
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import time
+
+import pandas as pd
+
+
+STAGE_CACHE_DIR = 'stage_cache'
+PIPELINE_VERSION = '2'
+
+
+def _hash_value(value, digest):
+    if isinstance(value, pd.DataFrame):
+        digest.update(json.dumps([list(map(str, value.columns)), list(map(str, value.dtypes))]).encode())
+        digest.update(pd.util.hash_pandas_object(value.astype(str), index=True).to_numpy().tobytes())
+    elif isinstance(value, pd.Series):
+        digest.update(str(value.name).encode())
+        digest.update(pd.util.hash_pandas_object(value.astype(str), index=True).to_numpy().tobytes())
+    else:
+        digest.update(json.dumps(value, sort_keys=True, default=str).encode())
+
+
+def _code_version(func):
+    try:
+        return inspect.getsource(func)
+    except (OSError, TypeError):
+        return func.__code__.co_code.hex()
+
+
+def stage_key(func, inputs, config, depends=()):
+    digest = hashlib.sha256()
+    digest.update(PIPELINE_VERSION.encode())
+    for dependency in (func, *depends):
+        digest.update(_code_version(dependency).encode())
+    for name in sorted(inputs):
+        digest.update(name.encode())
+        _hash_value(inputs[name], digest)
+    _hash_value(config, digest)
+    return digest.hexdigest()
+
+
+def _save_output(output, path):
+    if isinstance(output, pd.DataFrame):
+        try:
+            import pyarrow.feather as feather
+            feather.write_feather(output, path + '.arrow', compression='uncompressed')
+            return
+        except ImportError:
+            pass
+        except (TypeError, ValueError, OverflowError):
+            # Arrow cannot hold e.g. uint256 amounts stored as Python ints
+            if os.path.exists(path + '.arrow'):
+                os.remove(path + '.arrow')
+    with open(path + '.pkl', 'wb') as f:
+        pickle.dump(output, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _load_output(path):
+    if os.path.exists(path + '.arrow'):
+        import pyarrow.feather as feather
+        # Memory-mapped read: numeric columns are backed by the cache file without copying
+        return feather.read_table(path + '.arrow', memory_map=True).to_pandas(split_blocks=True)
+    with open(path + '.pkl', 'rb') as f:
+        return pickle.load(f)
+
+
+class StageRunner:
+    def __init__(self, cache_dir=STAGE_CACHE_DIR, enabled=True):
+        self.cache_dir = cache_dir
+        self.enabled = enabled
+        self.log = []
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def run(self, name, func, inputs=None, config=None, depends=(), failed=None):
+        # failed(output) counts rows that hit a transient fetch error; such outputs are not cached
+        inputs = inputs or {}
+        config = config or {}
+        key = stage_key(func, inputs, config, depends)
+        path = os.path.join(self.cache_dir, f"{name}-{key[:16]}")
+        start = time.perf_counter()
+        cached = os.path.exists(path + '.arrow') or os.path.exists(path + '.pkl')
+        failed_rows = 0
+        if self.enabled and cached:
+            output = _load_output(path)
+        else:
+            output = func(**inputs, **config)
+            failed_rows = int(failed(output)) if failed else 0
+            if failed_rows:
+                print(f"Stage {name}: {failed_rows} rows failed to fetch, output not cached")
+            else:
+                _save_output(output, path)
+        self.log.append({
+            'stage': name,
+            'cache_hit': self.enabled and cached,
+            'failed_rows': failed_rows,
+            'seconds': round(time.perf_counter() - start, 3),
+            'key': key[:16],
+        })
+        return output
+
+    def log_frame(self):
+        return pd.DataFrame(self.log, columns=['stage', 'cache_hit', 'failed_rows', 'seconds', 'key'])